@@ -5,47 +5,105 @@ database table field metadata management.
 """
 
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
-from typing import List, Dict, Optional, Tuple
-import Levenshtein
+from typing import List
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
+
+try:
+    from pyspark.sql import SparkSession
+    try:
+        from pyspark.errors import ParseException
+    except ImportError:  # pyspark < 3.4
+        from pyspark.sql.utils import ParseException
+except ImportError:  # pyspark is only available on Databricks
+    SparkSession = None
+    ParseException = None
 
 
-def calculate_similarity(col1: str, col2: str) -> int:
+def compute_distance_matrix(tabo_cols: List[str], tabi_cols: List[str]) -> np.ndarray:
     """
-    Calculate the Levenshtein distance between two column names.
+    Compute the Levenshtein distance between every tabO and tabI column name.
+    Both lists must already be lower-cased. Distances above 3 are capped at 4,
+    since they never produce a match.
     
     Args:
-        col1: First column name
-        col2: Second column name
+        tabo_cols: Lower-cased column names of the output table (tabO)
+        tabi_cols: Lower-cased column names of the input table (tabI)
     
     Returns:
-        Levenshtein distance between the two strings
+        N x M uint8 matrix, with N = len(tabo_cols) and M = len(tabi_cols)
     """
-    return Levenshtein.distance(col1.lower(), col2.lower())
+    return process.cdist(tabo_cols, tabi_cols, scorer=Levenshtein.distance,
+                         score_cutoff=3, dtype=np.uint8, workers=-1)
+
+
+def _quote_identifier(name: str) -> str:
+    """Quote a SQL identifier with backticks, doubling any backtick it contains."""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def _quote_table_name(catalog: str, schema: str, table: str) -> str:
+    """Build the fully qualified, backtick-quoted table name used by every statement."""
+    parts = []
+    for part in (catalog, schema, table):
+        part = part.strip()
+        # Accept names the user already wrapped in backticks
+        if len(part) >= 2 and part.startswith('`') and part.endswith('`'):
+            part = part[1:-1].replace('``', '`')
+        parts.append(_quote_identifier(part))
+    return '.'.join(parts)
+
+
+def _sql_string_literal(value: str) -> str:
+    """Quote a Spark SQL string literal, escaping backslashes and single quotes."""
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
 
 
-def find_best_match(target_col: str, source_cols: List[str]) -> Optional[str]:
+@st.cache_resource
+def _spark():
+    """Return the SparkSession, created once and shared across reruns."""
+    if SparkSession is None:
+        raise ImportError("pyspark is not installed: run the app on Databricks or use app_demo.py")
+    return SparkSession.builder.getOrCreate()
+
+
+@st.cache_data(ttl=300)
+def _describe_table(catalog: str, schema: str, table: str) -> pd.DataFrame:
     """
-    Find the best matching column from source columns for a target column.
-    Returns the match only if the Levenshtein distance is <= 3.
+    Run DESCRIBE TABLE and extract column names and comments.
+    Results are cached for 5 minutes; errors are raised and never cached.
     
     Args:
-        target_col: Target column name
-        source_cols: List of source column names
+        catalog: Catalog name
+        schema: Schema name
+        table: Table name
     
     Returns:
-        Best matching column name or None if no match within threshold
+        DataFrame with columns: column_name, comment
     """
-    best_match = None
-    best_distance = float('inf')
+    spark = _spark()
+    
+    # Get table description
+    full_table_name = _quote_table_name(catalog, schema, table)
+    describe_df = spark.sql(f"DESCRIBE TABLE {full_table_name}")
+    
+    df = describe_df.toPandas()
     
-    for source_col in source_cols:
-        distance = calculate_similarity(target_col, source_col)
-        if distance <= 3 and distance < best_distance:
-            best_distance = distance
-            best_match = source_col
+    # Keep only the column list, dropping partition information and other metadata sections
+    section_start = df.index[df['col_name'].str.startswith('#')]
+    if len(section_start):
+        df = df.iloc[:section_start[0]]
+    df = df[df['col_name'] != '']
     
-    return best_match
+    # Extract column names and comments
+    return pd.DataFrame({
+        'column_name': df['col_name'].tolist(),
+        'comment': df['comment'].fillna('').tolist()
+    })
 
 
 def get_table_metadata(catalog: str, schema: str, table: str) -> pd.DataFrame:
@@ -61,28 +119,7 @@ def get_table_metadata(catalog: str, schema: str, table: str) -> pd.DataFrame:
         DataFrame with columns: column_name, comment
     """
     try:
-        from pyspark.sql import SparkSession
-        spark = SparkSession.builder.getOrCreate()
-        
-        # Get table description
-        full_table_name = f"{catalog}.{schema}.{table}"
-        describe_df = spark.sql(f"DESCRIBE TABLE {full_table_name}")
-        
-        # Extract column names and comments
-        columns_data = []
-        for row in describe_df.collect():
-            # Skip partition information and other metadata
-            if row['col_name'].startswith('#') or row['col_name'] == '':
-                continue
-            if row['col_name'] == '# Partition Information':
-                break
-                
-            columns_data.append({
-                'column_name': row['col_name'],
-                'comment': row['comment'] if row['comment'] else ''
-            })
-        
-        return pd.DataFrame(columns_data)
+        return _describe_table(catalog, schema, table)
     except Exception as e:
         st.error(f"Error retrieving table metadata: {str(e)}")
         return pd.DataFrame(columns=['column_name', 'comment'])
@@ -99,24 +136,37 @@ def update_table_comments(catalog: str, schema: str, table: str, updates: pd.Dat
         updates: DataFrame with columns to update
     """
     try:
-        from pyspark.sql import SparkSession
-        spark = SparkSession.builder.getOrCreate()
+        spark = _spark()
         
-        full_table_name = f"{catalog}.{schema}.{table}"
+        full_table_name = _quote_table_name(catalog, schema, table)
         
-        for _, row in updates.iterrows():
-            if row['sostituire']:
-                col_name = row['colonna_tabo']
-                new_comment = row['descrizione_proposta']
-                
-                # Escape single quotes in comments
-                escaped_comment = new_comment.replace("'", "\\'")
-                
-                # Execute ALTER TABLE command
-                sql = f"ALTER TABLE {full_table_name} ALTER COLUMN `{col_name}` COMMENT '{escaped_comment}'"
-                spark.sql(sql)
+        selected = updates.loc[updates['sostituire']]
+        
+        # Comments are written as escaped literals: parameter markers are not
+        # accepted in the COMMENT clause of DDL statements
+        clauses = []
+        new_comments = selected['descrizione_proposta'].fillna('')
+        for col_name, new_comment in zip(selected['colonna_tabo'], new_comments):
+            clauses.append(f"{_quote_identifier(col_name)} COMMENT {_sql_string_literal(new_comment)}")
+        
+        if clauses:
+            try:
+                try:
+                    # Update all columns with a single ALTER TABLE command (Databricks Runtime 16.3+)
+                    spark.sql(f"ALTER TABLE {full_table_name} ALTER COLUMN {', '.join(clauses)}")
+                except ParseException:
+                    # Older runtimes only parse one column per statement. Run them one after
+                    # another: concurrent metadata commits on the same Delta table conflict
+                    for done, clause in enumerate(clauses):
+                        try:
+                            spark.sql(f"ALTER TABLE {full_table_name} ALTER COLUMN {clause}")
+                        except Exception as e:
+                            raise RuntimeError(f"{done} of {len(clauses)} columns updated before the error: {e}") from e
+            finally:
+                # Comments may have changed even if an update failed: drop the cached DESCRIBE TABLE results
+                _describe_table.clear()
         
-        st.success(f"Successfully updated {len(updates[updates['sostituire']])} column comments!")
+        st.success(f"Successfully updated {len(selected)} column comments!")
     except Exception as e:
         st.error(f"Error updating table comments: {str(e)}")
 
@@ -132,25 +182,55 @@ def create_decision_table(tabi_metadata: pd.DataFrame, tabo_metadata: pd.DataFra
     Returns:
         DataFrame with the decision table structure
     """
-    decision_data = []
-    used_tabi_cols = set()
+    colonna_tabo_l = []
+    comment_tabo_l = []
+    colonna_tabi_l = []
+    comment_tabi_l = []
+    descrizione_proposta_l = []
+    tabi_cols = tabi_metadata['column_name'].tolist()
+    tabi_comment_by_name = dict(zip(tabi_metadata['column_name'], tabi_metadata['comment']))
+    tabo_pairs = list(zip(tabo_metadata['column_name'].tolist(), tabo_metadata['comment'].tolist()))
     
-    for _, tabo_row in tabo_metadata.iterrows():
-        tabo_col = tabo_row['column_name']
-        tabo_comment = tabo_row['comment']
-        
-        # Find best match in tabI
-        available_tabi_cols = [col for col in tabi_metadata['column_name'].tolist() 
-                               if col not in used_tabi_cols]
-        best_match = find_best_match(tabo_col, available_tabi_cols)
-        
+    # Lower-case both column lists once for the whole matching
+    tabi_names_lower = tabi_metadata['column_name'].str.lower().tolist()
+    tabo_names_lower = tabo_metadata['column_name'].str.lower().tolist()
+    
+    # Claim exact (case-insensitive) matches first with a dict lookup
+    tabi_index_by_lower = {}
+    for j, name in enumerate(tabi_names_lower):
+        tabi_index_by_lower.setdefault(name, j)
+    
+    used_mask = np.zeros(len(tabi_cols), dtype=bool)
+    match_index = [None] * len(tabo_pairs)
+    for i, name in enumerate(tabo_names_lower):
+        j = tabi_index_by_lower.get(name)
+        if j is not None and not used_mask[j]:
+            match_index[i] = j
+            used_mask[j] = True
+    
+    # Only the columns left unmatched enter the fuzzy search
+    fuzzy_rows = [i for i, j in enumerate(match_index) if j is None]
+    free_cols = np.flatnonzero(~used_mask)
+    dm = compute_distance_matrix([tabo_names_lower[i] for i in fuzzy_rows],
+                                 [tabi_names_lower[j] for j in free_cols])
+    
+    # Optimal 1-to-1 assignment: non-matching pairs cost more than the largest possible
+    # sum of real distances (3 per match), so the number of matches is maximised first.
+    # scipy.optimize is slow to import and only needed here, so it is loaded lazily
+    from scipy.optimize import linear_sum_assignment
+    no_match_cost = 3 * min(dm.shape) + 1
+    cost = np.where(dm <= 3, dm, no_match_cost).astype(np.int32)
+    for k, j in zip(*linear_sum_assignment(cost)):
+        if cost[k, j] <= 3:
+            match_index[fuzzy_rows[k]] = int(free_cols[j])
+    
+    for (tabo_col, tabo_comment), j in zip(tabo_pairs, match_index):
         tabi_col = ''
         tabi_comment = ''
         
-        if best_match:
-            used_tabi_cols.add(best_match)
-            tabi_col = best_match
-            tabi_comment = tabi_metadata[tabi_metadata['column_name'] == best_match]['comment'].iloc[0]
+        if j is not None:
+            tabi_col = tabi_cols[j]
+            tabi_comment = tabi_comment_by_name[tabi_col]
         
         # Determine proposed description
         if tabo_comment:
@@ -160,16 +240,21 @@ def create_decision_table(tabi_metadata: pd.DataFrame, tabo_metadata: pd.DataFra
         else:
             descrizione_proposta = ''
         
-        decision_data.append({
-            'sostituire': True,  # Default to "Sostituire"
-            'colonna_tabo': tabo_col,
-            'comment_tabo': tabo_comment,
-            'colonna_tabi': tabi_col,
-            'comment_tabi': tabi_comment,
-            'descrizione_proposta': descrizione_proposta
-        })
+        colonna_tabo_l.append(tabo_col)
+        comment_tabo_l.append(tabo_comment)
+        colonna_tabi_l.append(tabi_col)
+        comment_tabi_l.append(tabi_comment)
+        descrizione_proposta_l.append(descrizione_proposta)
     
-    return pd.DataFrame(decision_data)
+    # Arrow-backed string columns are handed to st.data_editor without per-cell conversion
+    return pd.DataFrame({
+        'sostituire': np.ones(len(colonna_tabo_l), dtype=bool),  # Default to "Sostituire"
+        'colonna_tabo': pd.array(colonna_tabo_l, dtype='string[pyarrow]'),
+        'comment_tabo': pd.array(comment_tabo_l, dtype='string[pyarrow]'),
+        'colonna_tabi': pd.array(colonna_tabi_l, dtype='string[pyarrow]'),
+        'comment_tabi': pd.array(comment_tabi_l, dtype='string[pyarrow]'),
+        'descrizione_proposta': pd.array(descrizione_proposta_l, dtype='string[pyarrow]')
+    })
 
 
 def main():
@@ -218,9 +303,13 @@ def main():
             st.error("⚠️ Compilare tutti i campi per entrambe le tabelle!")
         else:
             with st.spinner("Caricamento metadati in corso..."):
-                # Get metadata from both tables
-                tabi_metadata = get_table_metadata(tabi_catalog, tabi_schema, tabi_table)
-                tabo_metadata = get_table_metadata(tabo_catalog, tabo_schema, tabo_table)
+                # Get metadata from both tables concurrently; the workers share this
+                # script run context so their st.* calls reach the page
+                with ThreadPoolExecutor(max_workers=2, initializer=add_script_run_ctx,
+                                        initargs=(None, get_script_run_ctx())) as executor:
+                    tabi_future = executor.submit(get_table_metadata, tabi_catalog, tabi_schema, tabi_table)
+                    tabo_future = executor.submit(get_table_metadata, tabo_catalog, tabo_schema, tabo_table)
+                    tabi_metadata, tabo_metadata = tabi_future.result(), tabo_future.result()
                 
                 if not tabi_metadata.empty and not tabo_metadata.empty:
                     # Create decision table
@@ -5,30 +5,16 @@ Demo version without Databricks dependency for local testing.
 
 import streamlit as st
 import pandas as pd
-from typing import List, Optional
-import Levenshtein
+from typing import List
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Levenshtein
 
 
-def calculate_similarity(col1: str, col2: str) -> int:
-    """Calculate the Levenshtein distance between two column names."""
-    return Levenshtein.distance(col1.lower(), col2.lower())
-
-
-def find_best_match(target_col: str, source_cols: List[str]) -> Optional[str]:
-    """
-    Find the best matching column from source columns for a target column.
-    Returns the match only if the Levenshtein distance is <= 3.
-    """
-    best_match = None
-    best_distance = float('inf')
-    
-    for source_col in source_cols:
-        distance = calculate_similarity(target_col, source_col)
-        if distance <= 3 and distance < best_distance:
-            best_distance = distance
-            best_match = source_col
-    
-    return best_match
+def compute_distance_matrix(tabo_cols: List[str], tabi_cols: List[str]) -> np.ndarray:
+    """Compute the Levenshtein distance matrix between lower-cased tabO and tabI column names (capped at 4)."""
+    return process.cdist(tabo_cols, tabi_cols, scorer=Levenshtein.distance,
+                         score_cutoff=3, dtype=np.uint8, workers=-1)
 
 
 def get_demo_table_metadata(table_name: str) -> pd.DataFrame:
@@ -62,25 +48,55 @@ def get_demo_table_metadata(table_name: str) -> pd.DataFrame:
 
 def create_decision_table(tabi_metadata: pd.DataFrame, tabo_metadata: pd.DataFrame) -> pd.DataFrame:
     """Create the decision table by comparing two tables' metadata."""
-    decision_data = []
-    used_tabi_cols = set()
+    colonna_tabo_l = []
+    comment_tabo_l = []
+    colonna_tabi_l = []
+    comment_tabi_l = []
+    descrizione_proposta_l = []
+    tabi_cols = tabi_metadata['column_name'].tolist()
+    tabi_comment_by_name = dict(zip(tabi_metadata['column_name'], tabi_metadata['comment']))
+    tabo_pairs = list(zip(tabo_metadata['column_name'].tolist(), tabo_metadata['comment'].tolist()))
     
-    for _, tabo_row in tabo_metadata.iterrows():
-        tabo_col = tabo_row['column_name']
-        tabo_comment = tabo_row['comment']
-        
-        # Find best match in tabI
-        available_tabi_cols = [col for col in tabi_metadata['column_name'].tolist() 
-                               if col not in used_tabi_cols]
-        best_match = find_best_match(tabo_col, available_tabi_cols)
-        
+    # Lower-case both column lists once for the whole matching
+    tabi_names_lower = tabi_metadata['column_name'].str.lower().tolist()
+    tabo_names_lower = tabo_metadata['column_name'].str.lower().tolist()
+    
+    # Claim exact (case-insensitive) matches first with a dict lookup
+    tabi_index_by_lower = {}
+    for j, name in enumerate(tabi_names_lower):
+        tabi_index_by_lower.setdefault(name, j)
+    
+    used_mask = np.zeros(len(tabi_cols), dtype=bool)
+    match_index = [None] * len(tabo_pairs)
+    for i, name in enumerate(tabo_names_lower):
+        j = tabi_index_by_lower.get(name)
+        if j is not None and not used_mask[j]:
+            match_index[i] = j
+            used_mask[j] = True
+    
+    # Only the columns left unmatched enter the fuzzy search
+    fuzzy_rows = [i for i, j in enumerate(match_index) if j is None]
+    free_cols = np.flatnonzero(~used_mask)
+    dm = compute_distance_matrix([tabo_names_lower[i] for i in fuzzy_rows],
+                                 [tabi_names_lower[j] for j in free_cols])
+    
+    # Optimal 1-to-1 assignment: non-matching pairs cost more than the largest possible
+    # sum of real distances (3 per match), so the number of matches is maximised first.
+    # scipy.optimize is slow to import and only needed here, so it is loaded lazily
+    from scipy.optimize import linear_sum_assignment
+    no_match_cost = 3 * min(dm.shape) + 1
+    cost = np.where(dm <= 3, dm, no_match_cost).astype(np.int32)
+    for k, j in zip(*linear_sum_assignment(cost)):
+        if cost[k, j] <= 3:
+            match_index[fuzzy_rows[k]] = int(free_cols[j])
+    
+    for (tabo_col, tabo_comment), j in zip(tabo_pairs, match_index):
         tabi_col = ''
         tabi_comment = ''
         
-        if best_match:
-            used_tabi_cols.add(best_match)
-            tabi_col = best_match
-            tabi_comment = tabi_metadata[tabi_metadata['column_name'] == best_match]['comment'].iloc[0]
+        if j is not None:
+            tabi_col = tabi_cols[j]
+            tabi_comment = tabi_comment_by_name[tabi_col]
         
         # Determine proposed description
         if tabo_comment:
@@ -90,16 +106,21 @@ def create_decision_table(tabi_metadata: pd.DataFrame, tabo_metadata: pd.DataFra
         else:
             descrizione_proposta = ''
         
-        decision_data.append({
-            'sostituire': True,
-            'colonna_tabo': tabo_col,
-            'comment_tabo': tabo_comment,
-            'colonna_tabi': tabi_col,
-            'comment_tabi': tabi_comment,
-            'descrizione_proposta': descrizione_proposta
-        })
+        colonna_tabo_l.append(tabo_col)
+        comment_tabo_l.append(tabo_comment)
+        colonna_tabi_l.append(tabi_col)
+        comment_tabi_l.append(tabi_comment)
+        descrizione_proposta_l.append(descrizione_proposta)
     
-    return pd.DataFrame(decision_data)
+    # Arrow-backed string columns are handed to st.data_editor without per-cell conversion
+    return pd.DataFrame({
+        'sostituire': np.ones(len(colonna_tabo_l), dtype=bool),
+        'colonna_tabo': pd.array(colonna_tabo_l, dtype='string[pyarrow]'),
+        'comment_tabo': pd.array(comment_tabo_l, dtype='string[pyarrow]'),
+        'colonna_tabi': pd.array(colonna_tabi_l, dtype='string[pyarrow]'),
+        'comment_tabi': pd.array(comment_tabi_l, dtype='string[pyarrow]'),
+        'descrizione_proposta': pd.array(descrizione_proposta_l, dtype='string[pyarrow]')
+    })
 
 
 def main():
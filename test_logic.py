@@ -1,30 +1,22 @@
 """Test script to verify TABITABO core logic."""
 
 import pandas as pd
-import Levenshtein
 from typing import List, Optional
 
-
-def calculate_similarity(col1: str, col2: str) -> int:
-    """Calculate the Levenshtein distance between two column names."""
-    return Levenshtein.distance(col1.lower(), col2.lower())
+from app_demo import compute_distance_matrix, create_decision_table
 
 
 def find_best_match(target_col: str, source_cols: List[str]) -> Optional[str]:
-    """
-    Find the best matching column from source columns for a target column.
-    Returns the match only if the Levenshtein distance is <= 3.
-    """
-    best_match = None
-    best_distance = float('inf')
-    
-    for source_col in source_cols:
-        distance = calculate_similarity(target_col, source_col)
-        if distance <= 3 and distance < best_distance:
-            best_distance = distance
-            best_match = source_col
-    
-    return best_match
+    """Match a single tabO column against the source columns through the decision table."""
+    tabi_metadata = pd.DataFrame({'column_name': source_cols, 'comment': [''] * len(source_cols)})
+    tabo_metadata = pd.DataFrame({'column_name': [target_col], 'comment': ['']})
+    match = create_decision_table(tabi_metadata, tabo_metadata)['colonna_tabi'].iloc[0]
+    return match or None
+
+
+def distance(col1: str, col2: str) -> int:
+    """Levenshtein distance between two lower-cased column names, as used for matching."""
+    return int(compute_distance_matrix([col1], [col2])[0, 0])
 
 
 def test_similarity():
@@ -32,21 +24,21 @@ def test_similarity():
     print("Testing similarity calculation...")
     
     # Test exact match
-    assert calculate_similarity("customer_id", "customer_id") == 0
+    assert distance("customer_id", "customer_id") == 0
     print("✓ Exact match: customer_id == customer_id (distance: 0)")
     
     # Test 1 character difference
-    assert calculate_similarity("customer_id", "customer_i") == 1
+    assert distance("customer_id", "customer_i") == 1
     print("✓ 1 char diff: customer_id vs customer_i (distance: 1)")
     
     # Test 3 character difference
-    assert calculate_similarity("first_name", "firstname") == 1  # One underscore removed
+    assert distance("first_name", "firstname") == 1  # One underscore removed
     print("✓ Similar: first_name vs firstname (distance: 1)")
     
-    # Test completely different
-    distance = calculate_similarity("customer_id", "product_name")
-    assert distance > 3
-    print(f"✓ Different: customer_id vs product_name (distance: {distance})")
+    # Test completely different (distances above 3 are capped at 4)
+    d = distance("customer_id", "product_name")
+    assert d == 4
+    print(f"✓ Different: customer_id vs product_name (distance: {d})")
     
     print("\nAll similarity tests passed! ✓\n")
 
@@ -96,43 +88,7 @@ def test_decision_table():
     })
     
     # Create decision table
-    decision_data = []
-    used_tabi_cols = set()
-    
-    for _, tabo_row in tabo_metadata.iterrows():
-        tabo_col = tabo_row['column_name']
-        tabo_comment = tabo_row['comment']
-        
-        available_tabi_cols = [col for col in tabi_metadata['column_name'].tolist() 
-                               if col not in used_tabi_cols]
-        best_match = find_best_match(tabo_col, available_tabi_cols)
-        
-        tabi_col = ''
-        tabi_comment = ''
-        
-        if best_match:
-            used_tabi_cols.add(best_match)
-            tabi_col = best_match
-            tabi_comment = tabi_metadata[tabi_metadata['column_name'] == best_match]['comment'].iloc[0]
-        
-        # Determine proposed description
-        if tabo_comment:
-            descrizione_proposta = tabo_comment
-        elif tabi_comment:
-            descrizione_proposta = tabi_comment
-        else:
-            descrizione_proposta = ''
-        
-        decision_data.append({
-            'sostituire': True,
-            'colonna_tabo': tabo_col,
-            'comment_tabo': tabo_comment,
-            'colonna_tabi': tabi_col,
-            'comment_tabi': tabi_comment,
-            'descrizione_proposta': descrizione_proposta
-        })
-    
-    result_df = pd.DataFrame(decision_data)
+    result_df = create_decision_table(tabi_metadata, tabo_metadata)
     
     # Verify results
     assert len(result_df) == 5, f"Expected 5 rows, got {len(result_df)}"
@@ -160,6 +116,62 @@ def test_decision_table():
     print("\nAll decision table tests passed! ✓\n")
 
 
+def _metadata(columns: List[str], comments: Optional[List[str]] = None) -> pd.DataFrame:
+    """Build a metadata DataFrame as returned by get_table_metadata."""
+    return pd.DataFrame({'column_name': columns, 'comment': comments or [''] * len(columns)}, dtype=object)
+
+
+def test_matching_rules():
+    """Test exact-match priority and the optimal assignment."""
+    print("Testing matching rules...")
+    
+    # Greedy would give abcx -> abcd (1) and abcd_ -> abxx (3); the optimal assignment costs 2
+    result_df = create_decision_table(_metadata(['abcd', 'abxx']), _metadata(['abcx', 'abcd_']))
+    assert result_df['colonna_tabi'].tolist() == ['abxx', 'abcd']
+    print("✓ Optimal assignment: abcx -> abxx, abcd_ -> abcd")
+    
+    # An exact match is not taken by an earlier, merely similar column
+    result_df = create_decision_table(_metadata(['email']), _metadata(['emails', 'Email']))
+    assert result_df['colonna_tabi'].tolist() == ['', 'email']
+    print("✓ Exact match first: Email -> email, emails unmatched")
+    
+    print("\nAll matching rule tests passed! ✓\n")
+
+
+def test_empty_tables():
+    """Test the decision table with an empty tabI or tabO."""
+    print("Testing empty tables...")
+    
+    # Empty tabI: no matches, tabO comments are still proposed
+    result_df = create_decision_table(_metadata([]), _metadata(['status', 'email'], ['User status', '']))
+    assert result_df['colonna_tabi'].tolist() == ['', '']
+    assert result_df['descrizione_proposta'].tolist() == ['User status', '']
+    print("✓ Empty tabI: 2 unmatched rows")
+    
+    # Empty tabO: no rows, but all six columns
+    result_df = create_decision_table(_metadata(['email']), _metadata([]))
+    assert len(result_df) == 0
+    assert result_df.columns.tolist() == ['sostituire', 'colonna_tabo', 'comment_tabo',
+                                          'colonna_tabi', 'comment_tabi', 'descrizione_proposta']
+    print("✓ Empty tabO: no rows, six columns")
+    
+    print("\nAll empty table tests passed! ✓\n")
+
+
+def test_decision_table_dtypes():
+    """Test the column dtypes handed to st.data_editor."""
+    print("Testing decision table dtypes...")
+    
+    result_df = create_decision_table(_metadata(['email']), _metadata(['email', 'status']))
+    assert result_df['sostituire'].dtype == bool
+    assert result_df['sostituire'].all()
+    for column in ['colonna_tabo', 'comment_tabo', 'colonna_tabi', 'comment_tabi', 'descrizione_proposta']:
+        assert result_df[column].dtype == pd.StringDtype('pyarrow'), column
+    print("✓ sostituire is bool, text columns are string[pyarrow]")
+    
+    print("\nAll dtype tests passed! ✓\n")
+
+
 if __name__ == "__main__":
     print("="*60)
     print("TABITABO Core Logic Tests")
@@ -168,6 +180,9 @@ if __name__ == "__main__":
     test_similarity()
     test_best_match()
     test_decision_table()
+    test_matching_rules()
+    test_empty_tables()
+    test_decision_table_dtypes()
     
     print("="*60)
     print("All tests passed successfully! ✓✓✓")